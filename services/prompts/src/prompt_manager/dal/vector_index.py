@@ -50,10 +50,13 @@ class VectorIndex:
         return self._serialize_vector_sqlite(embedding)
 
     def _serialize_vector_sqlite(self, embedding: List[float]) -> bytes:
-        """序列化浮点向量为字节流 (SQLite)"""
+        """序列化浮点向量为小端 float32 字节流 (SQLite)
+
+        sqlite-vec 的写入与 MATCH 查询均可直接接收该格式，避免 JSON 文本的序列化与解析开销。
+        """
         if not embedding:
             raise ValueError("embedding must not be empty")
-        return struct.pack(f'{len(embedding)}f', *embedding)
+        return struct.pack(f'<{len(embedding)}f', *embedding)
     
     def _format_vector_postgres(self, embedding: List[float]) -> str:
         """格式化向量为字符串 (PostgreSQL pgvector)"""
@@ -118,10 +121,10 @@ class VectorIndex:
                 """))
                 try:
                     # Verify sqlite-vec by issuing a simple MATCH that returns distance
-                    zero_json = json.dumps([0.0] * self.dimension)
+                    zero_vec = self._serialize_vector_sqlite([0.0] * self.dimension)
                     await session.execute(
                         text("SELECT version_id, distance FROM vec_prompts WHERE description_vector MATCH :query LIMIT 1"),
-                        {"query": zero_json}
+                        {"query": zero_vec}
                     )
                     self.use_virtual = True
                 except Exception as e:
@@ -246,7 +249,7 @@ class VectorIndex:
                         ORDER BY distance LIMIT :k
                         """
                     ),
-                    {"query": json.dumps(query_embedding), "k": k}
+                    {"query": self._serialize_vector_sqlite(query_embedding), "k": k}
                 )
                 return result.fetchall()
             except Exception as e:
@@ -270,7 +273,7 @@ class VectorIndex:
             q = query_embedding
             results = []
             for vid, vec_bytes in rows:
-                vec = list(struct.unpack(f'{self.dimension}f', vec_bytes))
+                vec = list(struct.unpack(f'<{self.dimension}f', vec_bytes))
                 d = _dist(q, vec)
                 results.append((vid, d))
             results.sort(key=lambda x: x[1])
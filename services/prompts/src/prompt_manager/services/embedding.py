@@ -1,5 +1,8 @@
 # Copyright (c) Kirky.X. 2025. All rights reserved.
-from typing import List, Optional, Sequence
+import asyncio
+import hashlib
+from array import array
+from typing import List, Optional, Sequence, Set, Tuple, Union
 
 from openai import AsyncOpenAI
 from .local_embedding import LocalEmbeddingProvider
@@ -10,6 +13,50 @@ from ..utils.config import VectorConfig
 from ..utils.exceptions import VectorIndexError
 from ..utils.logger import get_logger
 
+_CACHE_QUANTIZATIONS = ("none", "int8", "binary", "bfloat16")
+
+# 缓存条目: float32/bfloat16 数组、(int8 数组, 缩放系数)、(符号位字节, 平均幅值, 维度)
+_CacheEntry = Union[array, Tuple[array, float], Tuple[bytes, float, int]]
+
+
+def _quantize(vec: List[float], mode: str) -> _CacheEntry:
+    """将向量压缩为缓存存储格式
+
+    - none: float32，4 字节/维
+    - int8: 按最大绝对值线性缩放，1 字节/维
+    - binary: 仅保留符号位并记录平均幅值，1 比特/维
+    - bfloat16: 截取 float32 高 16 位（就近舍入），2 字节/维
+    """
+    f32 = array("f", vec)
+    if mode == "int8":
+        peak = max(map(abs, f32), default=0.0)
+        scale = peak / 127 if peak else 1.0
+        return array("b", [round(x / scale) for x in f32]), scale
+    if mode == "binary":
+        bits = bytearray((len(f32) + 7) // 8)
+        for i, x in enumerate(f32):
+            if x > 0:
+                bits[i >> 3] |= 0x80 >> (i & 7)
+        mean_abs = sum(map(abs, f32)) / len(f32) if f32 else 0.0
+        return bytes(bits), mean_abs, len(f32)
+    if mode == "bfloat16":
+        u32 = array("I", f32.tobytes())
+        return array("H", [(u + 0x7FFF + ((u >> 16) & 1)) >> 16 for u in u32])
+    return f32
+
+
+def _dequantize(entry: _CacheEntry, mode: str) -> List[float]:
+    """将缓存存储格式还原为浮点向量"""
+    if mode == "int8":
+        q, scale = entry
+        return [x * scale for x in q]
+    if mode == "binary":
+        bits, mean_abs, n = entry
+        return [mean_abs if bits[i >> 3] & (0x80 >> (i & 7)) else -mean_abs for i in range(n)]
+    if mode == "bfloat16":
+        return array("f", array("I", [h << 16 for h in entry]).tobytes()).tolist()
+    return entry.tolist()
+
 
 class EmbeddingService:
     def __init__(self, config: VectorConfig):
@@ -36,11 +83,22 @@ class EmbeddingService:
         )
         if config.enabled and config.embedding_api_key:
             self.client = AsyncOpenAI(api_key=config.embedding_api_key)
+        self.batch_window_ms = config.batch_window_ms
+        self._pending: List[Tuple[str, asyncio.Future]] = []
+        self.batch_window_max_items = max(1, config.batch_window_max_items)
+        self._flush_task: Optional[asyncio.Task] = None
+        self._flush_tasks: Set[asyncio.Task] = set()
         self.result_cache = None
-        if getattr(config, "result_cache_enabled", True):
-            ttl = timedelta(seconds=getattr(config, "result_cache_ttl_seconds", 3600))
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.usage = {"requests": 0, "texts": 0, "local_texts": 0, "remote_texts": 0, "failed_texts": 0}
+        self.cache_quantization = config.cache_quantization.lower()
+        if self.cache_quantization not in _CACHE_QUANTIZATIONS:
+            raise ValueError(f"Unsupported cache_quantization: {self.cache_quantization}")
+        if config.result_cache_enabled:
+            ttl = timedelta(seconds=config.result_cache_ttl_seconds)
             self.result_cache = Cache.builder() \
-                .max_capacity(getattr(config, "result_cache_capacity", 1000)) \
+                .max_capacity(config.result_cache_capacity) \
                 .time_to_live(ttl) \
                 .build()
 
@@ -61,18 +119,18 @@ class EmbeddingService:
         cached = self._cache_get(text)
         if cached is not None:
             return cached
+        if self.batch_window_ms > 0:
+            return await self._enqueue(text)
         if self._should_use_local():
             try:
                 vecs = self.local_provider.encode([text], batch_size=self.config.batch_size, max_length=self.config.max_length)
-                aligned = self._align_dim(vecs[0])
-                self._cache_put(text, aligned)
+                aligned = self._cache_put(text, self._align_dim(vecs[0]))
                 self._record_usage(local=True, batch_size=1)
                 return aligned
             except Exception as le:
                 self.logger.error("Local embedding failed", error=str(le))
-                aligned = self._align_dim(self._zero_vec())
-                self._cache_put(text, aligned)
-                return aligned
+                self._record_usage(local=True, batch_size=1, failed=True)
+                return self._cache_put(text, self._align_dim(self._zero_vec()))
 
         try:
             response = await self.client.embeddings.create(
@@ -80,21 +138,98 @@ class EmbeddingService:
                 input=text
             )
             vec = list(map(float, response.data[0].embedding))
-            aligned = self._align_dim(vec)
-            self._cache_put(text, aligned)
+            aligned = self._cache_put(text, self._align_dim(vec))
+            self._record_usage(local=False, batch_size=1)
             return aligned
         except Exception as e:
             self.logger.error("Remote embedding failed, switching to local", error=str(e))
+            failed = False
             try:
                 vecs = self.local_provider.encode([text], batch_size=self.config.batch_size, max_length=self.config.max_length)
                 aligned = self._align_dim(vecs[0])
             except Exception as le:
                 self.logger.error("Local embedding failed after remote error", error=str(le))
                 aligned = self._align_dim(self._zero_vec())
-            self._cache_put(text, aligned)
-            self._record_usage(local=True, batch_size=1)
+                failed = True
+            aligned = self._cache_put(text, aligned)
+            self._record_usage(local=True, batch_size=1, failed=failed)
             return aligned
 
+    async def _enqueue(self, text: str) -> List[float]:
+        """将请求加入合并窗口，窗口结束或达到批量上限后与其他并发请求一起批量生成"""
+        fut = asyncio.get_running_loop().create_future()
+        self._pending.append((text, fut))
+        if len(self._pending) >= self.batch_window_max_items:
+            self._spawn_flush(0, self._detach_pending())
+        elif self._flush_task is None or self._flush_task.done():
+            self._flush_task = self._spawn_flush(self.batch_window_ms / 1000)
+        return await fut
+
+    def _spawn_flush(self, delay: float, batch: Optional[List[Tuple[str, asyncio.Future]]] = None) -> asyncio.Task:
+        # 持有任务引用，防止执行中的批量任务被回收
+        task = asyncio.create_task(self._flush_after(delay, batch))
+        self._flush_tasks.add(task)
+
+        def _on_done(t: asyncio.Task) -> None:
+            self._flush_tasks.discard(t)
+            # 任务在首次执行前即被取消时 finally 不会运行，在此摘下窗口并通知调用方
+            orphans = list(batch or [])
+            if t is self._flush_task:
+                self._flush_task = None
+                orphans += self._pending
+                self._pending = []
+            for _, fut in orphans:
+                if not fut.done():
+                    fut.set_exception(VectorIndexError("Embedding batch flush aborted"))
+
+        task.add_done_callback(_on_done)
+        return task
+
+    def _detach_pending(self) -> List[Tuple[str, asyncio.Future]]:
+        batch, self._pending = self._pending, []
+        if self._flush_task is not None and self._flush_task is asyncio.current_task():
+            self._flush_task = None
+        return batch
+
+    async def _flush_after(self, delay: float, batch: Optional[List[Tuple[str, asyncio.Future]]] = None) -> None:
+        try:
+            if batch is None:
+                await asyncio.sleep(delay)
+                batch = self._detach_pending()
+            await self._flush(batch)
+        finally:
+            # 等待窗口期间被取消时仍需摘下当前窗口，确保后续请求能开启新窗口
+            if batch is None:
+                batch = self._detach_pending()
+            # 兜底：取消或意外异常时，不让任何调用方永久挂起
+            for _, fut in batch:
+                if not fut.done():
+                    fut.set_exception(VectorIndexError("Embedding batch flush aborted"))
+
+    async def _flush(self, batch: List[Tuple[str, asyncio.Future]]) -> None:
+        if not batch:
+            return
+        # 按归一化文本去重，每组仅发送首个原文
+        groups: dict = {}
+        for t, _ in batch:
+            groups.setdefault(self._normalize_text(t), t)
+        unique = list(groups.values())
+        try:
+            vecs = await self._embed_batch(unique)
+            if len(vecs) != len(unique):
+                raise VectorIndexError(
+                    f"Embedding batch size mismatch: expected {len(unique)}, got {len(vecs)}"
+                )
+        except Exception as e:
+            for _, fut in batch:
+                if not fut.done():
+                    fut.set_exception(e)
+            return
+        by_key = dict(zip(groups, vecs))
+        for t, fut in batch:
+            if not fut.done():
+                fut.set_result(list(by_key[self._normalize_text(t)]))
+
     def _should_use_local(self, force: bool = False) -> bool:
         pri = (self.config.provider_priority or "remote_first").lower()
         if force:
@@ -106,39 +241,78 @@ class EmbeddingService:
         return not self.client
 
     async def generate_batch(self, texts: Sequence[str]) -> List[List[float]]:
+        """批量生成文本向量嵌入
+
+        先查询结果缓存，仅将未命中且去重后的文本合并为一次提供方调用，结果按输入顺序返回。
+
+        Args:
+            texts (Sequence[str]): 待生成嵌入的文本序列。
+
+        Returns:
+            List[List[float]]: 与输入一一对应的浮点向量列表。
+
+        Raises:
+            VectorIndexError: 当远端批量生成失败且无法回退本地，或返回向量数量与输入不一致时抛出。
+        """
+        texts = list(texts)
+        out: List[Optional[List[float]]] = [self._cache_get(t) for t in texts]
+        keys = [self._normalize_text(t) for t in texts]
+        # 按归一化文本去重未命中项，每组仅发送首个原文
+        pending: dict = {}
+        for t, k, v in zip(texts, keys, out):
+            if v is None:
+                pending.setdefault(k, t)
+        if pending:
+            vecs = await self._embed_batch(list(pending.values()))
+            if len(vecs) != len(pending):
+                raise VectorIndexError(
+                    f"Embedding batch size mismatch: expected {len(pending)}, got {len(vecs)}"
+                )
+            fresh = dict(zip(pending, vecs))
+            seen = set()
+            for i, (k, v) in enumerate(zip(keys, out)):
+                if v is None:
+                    # 重复文本返回独立副本，避免调用方之间相互污染
+                    out[i] = list(fresh[k]) if k in seen else fresh[k]
+                    seen.add(k)
+        return out
+
+    async def _embed_batch(self, texts: List[str]) -> List[List[float]]:
         if self._should_use_local():
+            failed = False
             try:
-                vecs = self.local_provider.encode(list(texts), batch_size=self.config.batch_size, max_length=self.config.max_length)
+                vecs = self.local_provider.encode(texts, batch_size=self.config.batch_size, max_length=self.config.max_length)
                 aligned = [self._align_dim(v) for v in vecs]
             except Exception as le:
                 self.logger.error("Local batch embedding failed", error=str(le))
                 aligned = [self._align_dim(self._zero_vec()) for _ in texts]
-            for t, v in zip(texts, aligned):
-                self._cache_put(t, v)
-            self._record_usage(local=True, batch_size=len(texts))
+                failed = True
+            aligned = [self._cache_put(t, v) for t, v in zip(texts, aligned)]
+            self._record_usage(local=True, batch_size=len(texts), failed=failed)
             return aligned
         try:
             response = await self.client.embeddings.create(
                 model=self.config.embedding_model,
-                input=list(texts)
+                input=texts
             )
             out = [self._align_dim(list(map(float, d.embedding))) for d in response.data]
-            for t, v in zip(texts, out):
-                self._cache_put(t, v)
+            out = [self._cache_put(t, v) for t, v in zip(texts, out)]
+            self._record_usage(local=False, batch_size=len(texts))
             return out
         except Exception as e:
             self.logger.error("Remote batch embedding failed, switching to local", error=str(e))
             if not self._should_use_local(force=True):
                 raise VectorIndexError(f"Embedding batch generation failed: {str(e)}")
+            failed = False
             try:
-                vecs = self.local_provider.encode(list(texts), batch_size=self.config.batch_size, max_length=self.config.max_length)
+                vecs = self.local_provider.encode(texts, batch_size=self.config.batch_size, max_length=self.config.max_length)
                 aligned = [self._align_dim(v) for v in vecs]
             except Exception as le:
                 self.logger.error("Local batch embedding failed after remote error", error=str(le))
                 aligned = [self._align_dim(self._zero_vec()) for _ in texts]
-            for t, v in zip(texts, aligned):
-                self._cache_put(t, v)
-            self._record_usage(local=True, batch_size=len(texts))
+                failed = True
+            aligned = [self._cache_put(t, v) for t, v in zip(texts, aligned)]
+            self._record_usage(local=True, batch_size=len(texts), failed=failed)
             return aligned
 
     def _align_dim(self, vec: List[float]) -> List[float]:
@@ -152,18 +326,50 @@ class EmbeddingService:
             return vec[:target]
         return vec + [0.0] * (target - n)
 
+    def _normalize_text(self, text: str) -> str:
+        # 开启 cache_normalize_whitespace 时折叠首尾及连续空白，使仅空白不同的文本共享缓存与去重
+        if self.config.cache_normalize_whitespace:
+            return " ".join(text.split())
+        return text
+
+    def _cache_key(self, text: str) -> str:
+        # 128 位 BLAKE2b 摘要：比 SHA-256 更快，且避免以整段文本作为键常驻内存
+        digest = hashlib.blake2b(self._normalize_text(text).encode("utf-8"), digest_size=16).hexdigest()
+        return f"emb:{self.config.embedding_model}:{digest}"
+
     def _cache_get(self, key: str) -> Optional[List[float]]:
         if self.result_cache:
-            v = self.result_cache.get(f"emb:{self.config.embedding_model}:{key}")
+            v = self.result_cache.get(self._cache_key(key))
             if v is not None:
-                return v
+                self.cache_hits += 1
+                return _dequantize(v, self.cache_quantization)
+            self.cache_misses += 1
         return None
 
-    def _cache_put(self, key: str, value: List[float]) -> None:
-        if self.result_cache:
-            self.result_cache.insert(f"emb:{self.config.embedding_model}:{key}", value)
+    def _cache_put(self, key: str, value: List[float]) -> List[float]:
+        """写入结果缓存并返回调用方应得到的向量
+
+        默认以 float32 紧凑存储（与 sqlite-vec/pgvector 存储精度一致）。返回缓存表示还原后的向量，
+        使同一输入在未命中与命中时得到完全一致的结果。
+        """
+        if not self.result_cache:
+            return value
+        entry = _quantize(value, self.cache_quantization)
+        self.result_cache.insert(self._cache_key(key), entry)
+        return _dequantize(entry, self.cache_quantization)
 
-    def _record_usage(self, local: bool, batch_size: int):
+    def _record_usage(self, local: bool, batch_size: int, failed: bool = False):
+        # 按批次累加计数，单次调用 O(1)，与批大小无关；
+        # 以零向量兜底的文本计入 failed_texts，不计入本地/远端实际嵌入数
+        usage = self.usage
+        usage["requests"] += 1
+        usage["texts"] += batch_size
+        if failed:
+            usage["failed_texts"] += batch_size
+            return
+        usage["local_texts" if local else "remote_texts"] += batch_size
+        if not local:
+            return
         try:
             import psutil  # type: ignore
             import os
@@ -180,6 +386,20 @@ class EmbeddingService:
         except Exception:
             pass
 
+    def get_metrics(self) -> dict:
+        """获取嵌入服务的累计使用指标
+
+        Returns:
+            dict: 提供方调用次数、文本数、本地/远端文本数、零向量兜底文本数、平均批大小及结果缓存命中情况。
+        """
+        usage = self.usage
+        return {
+            **usage,
+            "avg_batch_size": usage["texts"] / usage["requests"] if usage["requests"] else 0.0,
+            "cache_hits": self.cache_hits,
+            "cache_misses": self.cache_misses,
+        }
+
     async def get_dimension(self) -> int:
         """获取当前生效的向量维度
         
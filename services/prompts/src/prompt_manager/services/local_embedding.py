@@ -115,6 +115,7 @@ class LocalEmbeddingProvider:
         self.use_modelscope = use_modelscope
         self.use_fp16 = use_fp16
         self.model = None
+        self._dimension: Optional[int] = None
 
     def ensure_loaded(self):
         if self.model is None:
@@ -145,14 +146,17 @@ class LocalEmbeddingProvider:
         Returns:
             int: The dimension size (e.g. 1024 for BGE-M3).
         """
+        if self._dimension is not None:
+            return self._dimension
         self.ensure_loaded()
         # BGE-M3 typically outputs 1024 dim dense vectors
-        # We can probe it by encoding a dummy string
+        # We can probe it by encoding a dummy string, once per provider
         try:
             with _suppress_model_logs():
                 vecs = self.encode(["test"], batch_size=1, max_length=32)
                 if vecs and len(vecs) > 0:
-                    return len(vecs[0])
+                    self._dimension = len(vecs[0])
+                    return self._dimension
         except Exception:
             pass
         return 1024  # Fallback default for BGE-M3
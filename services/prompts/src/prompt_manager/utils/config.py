@@ -57,6 +57,20 @@ class VectorConfig:
     use_modelscope: bool = True
     batch_size: int = 12
     max_length: int = 8192
+    result_cache_enabled: bool = True
+    result_cache_capacity: int = 1000
+    result_cache_ttl_seconds: int = 3600
+    # 结果缓存中向量的存储格式: none(float32) / int8 / binary / bfloat16
+    # 注意：非 none 模式为有损压缩，generate/generate_batch 返回（并由调用方写入向量索引、
+    # 用于检索）的将是量化还原后的向量；binary 仅保留每维符号，检索召回会明显下降
+    cache_quantization: str = "none"
+    # 并发 generate 请求的合并窗口（毫秒），0 表示不合并
+    batch_window_ms: int = 0
+    # 单个合并窗口内的最大文本数，达到后立即提交，避免超过提供方的单次输入上限
+    batch_window_max_items: int = 256
+    # 折叠首尾及连续空白后再计算缓存键，仅空白不同的文本共享同一缓存条目；
+    # 开启后返回的是首个被缓存文本的向量，默认关闭
+    cache_normalize_whitespace: bool = False
 
 
 @dataclass
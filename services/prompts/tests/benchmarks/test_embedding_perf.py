@@ -19,13 +19,19 @@ def test_local_batch_perf(benchmark):
         provider_priority="local_first",
         max_length=128,
         batch_size=8,
+        result_cache_enabled=False,
     )
     service = EmbeddingService(cfg)
     texts = [f"text {i}" for i in range(32)]
 
+    loop = asyncio.new_event_loop()
+
     def run_sync():
-        return asyncio.run(service.generate_batch(texts))
+        return loop.run_until_complete(service.generate_batch(texts))
 
-    result = benchmark(run_sync)
+    try:
+        result = benchmark(run_sync)
+    finally:
+        loop.close()
     assert len(result) == len(texts)
     assert len(result[0]) == cfg.dimension
@@ -1,7 +1,8 @@
 # Copyright (c) Kirky.X. 2025. All rights reserved.
 import asyncio
 import os
-from typing import AsyncGenerator
+from dataclasses import dataclass
+from typing import AsyncGenerator, Callable, List
 
 import pytest
 import pytest_asyncio
@@ -60,6 +61,20 @@ class MockEmbeddingService(EmbeddingService):
         return [seed] * self.dimension
 
 
+@dataclass
+class FakeEmbeddingData:
+    """OpenAI embeddings 响应条目的轻量替身"""
+
+    embedding: List[float]
+
+
+@dataclass
+class FakeEmbeddingResponse:
+    """OpenAI embeddings 响应的轻量替身，替代 MagicMock 以减少属性访问开销"""
+
+    data: List[FakeEmbeddingData]
+
+
 # ==========================================
 # Fixtures
 # ==========================================
@@ -180,3 +195,18 @@ async def prompt_manager(db_engine, test_config):
     finally:
         task.cancel()
         await queue.stop()
+
+
+@pytest.fixture
+def make_embedding_response() -> Callable[..., FakeEmbeddingResponse]:
+    """构建 OpenAI embeddings 响应替身
+
+    Returns:
+        Callable[..., FakeEmbeddingResponse]: 接收若干向量并返回对应响应对象的工厂函数。
+
+    Raises:
+        None
+    """
+    def _make(*vectors: List[float]) -> FakeEmbeddingResponse:
+        return FakeEmbeddingResponse([FakeEmbeddingData(list(v)) for v in vectors])
+    return _make
@@ -1,35 +1,40 @@
 # Copyright (c) Kirky.X. 2025. All rights reserved.
+import asyncio
+from array import array
+
 import pytest
-from unittest.mock import MagicMock, patch, AsyncMock
+from unittest.mock import patch, AsyncMock
 from prompt_manager.services.embedding import EmbeddingService
 from prompt_manager.services.local_embedding import LocalEmbeddingProvider
 from prompt_manager.utils.config import VectorConfig
 from prompt_manager.utils.exceptions import VectorIndexError
 
 
-class TestEmbeddingService:
-    def test_init_without_key(self):
-        """Test initialization without API key (default disabled)."""
-        config = VectorConfig(
-            dimension=1536,
-            enabled=False,
-            embedding_model="text-embedding-3-small",
-            embedding_api_key=None
-        )
-        service = EmbeddingService(config)
-        assert service.client is None
+def _f32(vec):
+    """结果缓存以 float32 存储，返回值与其精度一致"""
+    return array("f", vec).tolist()
 
-    def test_init_with_key_and_enabled(self):
-        """Test initialization with API key and enabled."""
+
+class TestEmbeddingService:
+    @pytest.mark.parametrize("enabled, api_key, expect_client", [
+        (False, None, False),
+        (True, None, False),
+        (False, "sk-test", False),
+        (True, "sk-test", True),
+    ])
+    def test_init_client(self, enabled, api_key, expect_client):
+        """The remote client is created only when enabled with an API key."""
         config = VectorConfig(
             dimension=1536,
-            enabled=True,
+            enabled=enabled,
             embedding_model="text-embedding-3-small",
-            embedding_api_key="sk-test"
+            embedding_api_key=api_key
         )
         service = EmbeddingService(config)
-        assert service.client is not None
-        assert service.client.api_key == "sk-test"
+        if expect_client:
+            assert service.client.api_key == api_key
+        else:
+            assert service.client is None
 
     @pytest.mark.asyncio
     async def test_generate_local_fallback(self):
@@ -47,27 +52,27 @@ class TestEmbeddingService:
         # Now local provider is used when remote disabled; dimension align pads/truncates
         assert isinstance(vector, list)
 
+    @pytest.mark.parametrize("dimension, remote_vec, expected", [
+        (4, [0.1, 0.2, 0.3, 0.4], [0.1, 0.2, 0.3, 0.4]),
+        (4, [0.1, 0.2, 0.3, 0.4, 0.5, 0.6], [0.1, 0.2, 0.3, 0.4]),
+        (4, [0.1, 0.2], [0.1, 0.2, 0.0, 0.0]),
+        # dimension=None keeps whatever the remote model returns
+        (None, [0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7], [0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7]),
+    ])
     @pytest.mark.asyncio
-    async def test_generate_api_success(self):
-        """Test successful API generation."""
+    async def test_generate_api_success(self, make_embedding_response, dimension, remote_vec, expected):
+        """Test successful API generation aligned to the configured dimension."""
         config = VectorConfig(
-            dimension=4,
+            dimension=dimension,
             enabled=True,
             embedding_model="text-embedding-3-small",
             embedding_api_key="sk-test"
         )
         service = EmbeddingService(config)
-        
-        # Mock OpenAI client response
-        mock_response = MagicMock()
-        mock_data = MagicMock()
-        mock_data.embedding = [0.1, 0.2, 0.3, 0.4]
-        mock_response.data = [mock_data]
-        
-        service.client.embeddings.create = AsyncMock(return_value=mock_response)
-        
+        service.client.embeddings.create = AsyncMock(return_value=make_embedding_response(remote_vec))
+
         vector = await service.generate("test")
-        assert vector == [0.1, 0.2, 0.3, 0.4]
+        assert vector == _f32(expected)
         service.client.embeddings.create.assert_awaited_once_with(
             model="text-embedding-3-small",
             input="test"
@@ -89,7 +94,7 @@ class TestEmbeddingService:
         # Should fallback to local provider instead of raising
         with patch.object(LocalEmbeddingProvider, "encode", return_value=[[0.3,0.4,0.5,0.6]]):
             vec = await service.generate("test")
-            assert vec == [0.3,0.4,0.5,0.6]
+            assert vec == _f32([0.3,0.4,0.5,0.6])
 
     @pytest.mark.asyncio
     async def test_generate_batch_local(self):
@@ -104,3 +109,412 @@ class TestEmbeddingService:
         with patch.object(LocalEmbeddingProvider, "encode", return_value=[[1,2,3,4],[2,3,4,5]]):
             out = await service.generate_batch(["a","b"])
             assert out == [[1,2,3,4],[2,3,4,5]]
+
+    @pytest.mark.asyncio
+    async def test_generate_batch_api_single_call(self, make_embedding_response):
+        """Batch generation should issue one provider call for all inputs."""
+        config = VectorConfig(
+            dimension=3,
+            enabled=True,
+            embedding_model="text-embedding-3-small",
+            embedding_api_key="sk-test"
+        )
+        service = EmbeddingService(config)
+        texts = [f"text {i}" for i in range(8)]
+
+        mock_response = make_embedding_response(*([0.1, 0.2, 0.3] for _ in texts))
+        service.client.embeddings.create = AsyncMock(return_value=mock_response)
+
+        out = await service.generate_batch(texts)
+        assert out == [_f32([0.1, 0.2, 0.3])] * 8
+        service.client.embeddings.create.assert_awaited_once_with(
+            model="text-embedding-3-small",
+            input=texts
+        )
+
+    @pytest.mark.asyncio
+    async def test_generate_batch_skips_cached_and_duplicates(self):
+        """Cached and repeated texts should not be sent to the provider again."""
+        config = VectorConfig(
+            dimension=2,
+            enabled=False,
+            provider_priority="local_first"
+        )
+        service = EmbeddingService(config)
+        with patch.object(LocalEmbeddingProvider, "encode", return_value=[[1.0, 2.0]]) as enc:
+            await service.generate("a")
+            enc.return_value = [[3.0, 4.0]]
+            out = await service.generate_batch(["a", "b", "b"])
+            assert out == [[1.0, 2.0], [3.0, 4.0], [3.0, 4.0]]
+            assert enc.call_count == 2
+            assert enc.call_args[0][0] == ["b"]
+        assert out[1] is not out[2]
+
+    @pytest.mark.asyncio
+    async def test_generate_batch_short_provider_response(self):
+        """A provider returning fewer vectors than inputs raises VectorIndexError."""
+        config = VectorConfig(
+            dimension=2,
+            enabled=False,
+            provider_priority="local_first"
+        )
+        service = EmbeddingService(config)
+        with patch.object(LocalEmbeddingProvider, "encode", return_value=[[1.0, 2.0]]):
+            with pytest.raises(VectorIndexError, match="batch size mismatch"):
+                await service.generate_batch(["a", "b"])
+
+    @pytest.mark.asyncio
+    async def test_generate_cache_hit(self):
+        """Repeated texts should be served from the result cache."""
+        config = VectorConfig(
+            dimension=2,
+            enabled=False,
+            provider_priority="local_first"
+        )
+        service = EmbeddingService(config)
+        with patch.object(LocalEmbeddingProvider, "encode", return_value=[[1.0, 2.0]]) as enc:
+            first = await service.generate("same")
+            first.append(9.0)
+            second = await service.generate("same")
+            assert second == [1.0, 2.0]
+            assert enc.call_count == 1
+        assert service.cache_hits == 1
+        assert service.cache_misses == 1
+
+    @pytest.mark.asyncio
+    async def test_cache_eviction_lru(self):
+        """The least recently used entry is evicted once capacity is exceeded."""
+        config = VectorConfig(
+            dimension=2,
+            enabled=False,
+            provider_priority="local_first",
+            result_cache_capacity=2
+        )
+        service = EmbeddingService(config)
+        with patch.object(LocalEmbeddingProvider, "encode", return_value=[[1.0, 2.0]]) as enc:
+            for text in ("a", "b", "c"):
+                await service.generate(text)
+            await service.generate("c")
+            assert enc.call_count == 3
+            await service.generate("a")
+            assert enc.call_count == 4
+
+    @pytest.mark.asyncio
+    async def test_cache_stores_float32(self):
+        """Cached vectors are stored as compact float32 arrays."""
+        config = VectorConfig(
+            dimension=3,
+            enabled=False,
+            provider_priority="local_first"
+        )
+        service = EmbeddingService(config)
+        with patch.object(LocalEmbeddingProvider, "encode", return_value=[[0.1, 0.2, 0.3]]):
+            miss = await service.generate("x")
+            hit = await service.generate("x")
+        stored = service.result_cache.get(service._cache_key("x"))
+        assert stored.typecode == "f"
+        assert stored.itemsize == 4
+        # 0.1 is not representable in float32: miss and hit must still agree exactly
+        assert miss == hit == _f32([0.1, 0.2, 0.3])
+
+    @pytest.mark.asyncio
+    async def test_generate_batch_miss_and_hit_identical(self):
+        """Batch results are identical whether computed or served from the cache."""
+        config = VectorConfig(
+            dimension=2,
+            enabled=False,
+            provider_priority="local_first"
+        )
+        service = EmbeddingService(config)
+        with patch.object(LocalEmbeddingProvider, "encode", return_value=[[0.1, 0.2], [0.3, 0.7]]) as enc:
+            miss = await service.generate_batch(["a", "b"])
+            hit = await service.generate_batch(["a", "b"])
+            assert enc.call_count == 1
+        assert miss == hit
+
+    @pytest.mark.asyncio
+    async def test_cache_int8_quantization_roundtrip(self):
+        """int8 cached vectors dequantize close to the original."""
+        vec = [((i * 37) % 101 - 50) / 50.0 for i in range(64)]
+        config = VectorConfig(
+            dimension=64,
+            enabled=False,
+            provider_priority="local_first",
+            cache_quantization="int8"
+        )
+        service = EmbeddingService(config)
+        with patch.object(LocalEmbeddingProvider, "encode", return_value=[vec]):
+            await service.generate("q")
+            cached = await service.generate("q")
+        q, _ = service.result_cache.get(service._cache_key("q"))
+        assert q.itemsize == 1
+        dot = sum(a * b for a, b in zip(vec, cached))
+        norm = (sum(a * a for a in vec) * sum(b * b for b in cached)) ** 0.5
+        assert dot / norm >= 0.99
+
+    @pytest.mark.asyncio
+    async def test_cache_binary_packs_to_dim_over_8_bytes(self):
+        """Binary cached vectors keep one sign bit per dimension."""
+        vec = [0.5, -0.5, 0.25, -0.25] * 4
+        config = VectorConfig(
+            dimension=16,
+            enabled=False,
+            provider_priority="local_first",
+            cache_quantization="binary"
+        )
+        service = EmbeddingService(config)
+        with patch.object(LocalEmbeddingProvider, "encode", return_value=[vec]):
+            await service.generate("b")
+            cached = await service.generate("b")
+        bits, _, _ = service.result_cache.get(service._cache_key("b"))
+        assert len(bits) == 16 // 8
+        assert cached == [0.375, -0.375] * 8
+
+    @pytest.mark.asyncio
+    async def test_cache_bfloat16_roundtrip(self):
+        """bfloat16 cached vectors keep about three significant digits."""
+        vec = [0.1, -0.2, 0.3, 1.5]
+        config = VectorConfig(
+            dimension=4,
+            enabled=False,
+            provider_priority="local_first",
+            cache_quantization="bfloat16"
+        )
+        service = EmbeddingService(config)
+        with patch.object(LocalEmbeddingProvider, "encode", return_value=[vec]):
+            await service.generate("h")
+            cached = await service.generate("h")
+        assert service.result_cache.get(service._cache_key("h")).itemsize == 2
+        assert cached == pytest.approx(vec, rel=1e-2)
+
+    @pytest.mark.parametrize("mode", ["none", "int8", "binary", "bfloat16"])
+    @pytest.mark.asyncio
+    async def test_cache_quantization_miss_and_hit_agree(self, mode):
+        """Every quantization mode returns the same vector on a miss and on a later hit."""
+        vec = [0.1, -0.7, 0.33, 0.9, -0.05, 0.2, -0.4, 0.6]
+        config = VectorConfig(
+            dimension=8,
+            enabled=False,
+            provider_priority="local_first",
+            cache_quantization=mode
+        )
+        service = EmbeddingService(config)
+        with patch.object(LocalEmbeddingProvider, "encode", return_value=[vec]):
+            miss = await service.generate("m")
+            hit = await service.generate("m")
+            batch_miss = await service.generate_batch(["n"])
+            batch_hit = await service.generate_batch(["n"])
+        assert miss == hit
+        assert batch_miss == batch_hit
+        assert batch_miss[0] == miss
+
+    def test_cache_quantization_invalid(self):
+        """Unknown cache_quantization modes are rejected at construction."""
+        config = VectorConfig(dimension=4, cache_quantization="fp4")
+        with pytest.raises(ValueError, match="Unsupported cache_quantization"):
+            EmbeddingService(config)
+
+    @pytest.mark.asyncio
+    async def test_micro_batch_coalesces_concurrent_calls(self, make_embedding_response):
+        """Concurrent generate calls inside the window share one provider call."""
+        config = VectorConfig(
+            dimension=2,
+            enabled=True,
+            embedding_model="text-embedding-3-small",
+            embedding_api_key="sk-test",
+            batch_window_ms=5
+        )
+        service = EmbeddingService(config)
+        texts = [f"text {i}" for i in range(8)]
+
+        mock_response = make_embedding_response(*([float(i), 1.0] for i in range(8)))
+        service.client.embeddings.create = AsyncMock(return_value=mock_response)
+
+        out = await asyncio.gather(*(service.generate(t) for t in texts))
+        assert out == [[float(i), 1.0] for i in range(8)]
+        service.client.embeddings.create.assert_awaited_once_with(
+            model="text-embedding-3-small",
+            input=texts
+        )
+
+    @pytest.mark.asyncio
+    async def test_micro_batch_dedupes_whitespace_variants(self):
+        """With folding on, whitespace variants in one window share a single input."""
+        service = EmbeddingService(
+            VectorConfig(dimension=2, batch_window_ms=5, cache_normalize_whitespace=True)
+        )
+        service._embed_batch = AsyncMock(return_value=[[1.0, 2.0]])
+
+        out = await asyncio.gather(service.generate("a b"), service.generate("a  b "))
+        service._embed_batch.assert_awaited_once_with(["a b"])
+        assert out[0] == out[1] == _f32([1.0, 2.0])
+
+    @pytest.mark.asyncio
+    async def test_micro_batch_provider_error_reaches_all_callers(self):
+        """A provider error in the flush is raised to every waiting caller."""
+        service = EmbeddingService(VectorConfig(dimension=2, batch_window_ms=5))
+        service._embed_batch = AsyncMock(side_effect=VectorIndexError("boom"))
+
+        results = await asyncio.gather(
+            *(service.generate(t) for t in ("a", "b", "c")), return_exceptions=True
+        )
+        assert all(isinstance(r, VectorIndexError) and "boom" in str(r) for r in results)
+
+    @pytest.mark.asyncio
+    async def test_micro_batch_short_provider_response(self):
+        """Fewer vectors than inputs fails every caller instead of hanging."""
+        service = EmbeddingService(VectorConfig(dimension=2, batch_window_ms=5))
+        service._embed_batch = AsyncMock(return_value=[[1.0, 2.0]])
+
+        results = await asyncio.wait_for(
+            asyncio.gather(service.generate("a"), service.generate("b"), return_exceptions=True),
+            timeout=1
+        )
+        assert all(isinstance(r, VectorIndexError) and "mismatch" in str(r) for r in results)
+
+    @pytest.mark.parametrize("started", [False, True])
+    @pytest.mark.asyncio
+    async def test_micro_batch_flush_cancelled(self, started):
+        """Cancelling the flush fails pending callers and lets later calls start a new window."""
+        service = EmbeddingService(VectorConfig(dimension=2, batch_window_ms=50))
+        service._embed_batch = AsyncMock(return_value=[[1.0, 2.0]])
+
+        waiting = [asyncio.create_task(service.generate(t)) for t in ("a", "b")]
+        await asyncio.sleep(0.01 if started else 0)
+        service._flush_task.cancel()
+        results = await asyncio.wait_for(asyncio.gather(*waiting, return_exceptions=True), timeout=1)
+        assert all(isinstance(r, VectorIndexError) for r in results)
+        assert service._flush_task is None
+
+        vec = await asyncio.wait_for(service.generate("c"), timeout=1)
+        assert vec == [1.0, 2.0]
+
+    @pytest.mark.asyncio
+    async def test_micro_batch_respects_max_items(self):
+        """A full window is flushed immediately in batches capped at batch_window_max_items."""
+        service = EmbeddingService(VectorConfig(dimension=1, batch_window_ms=5, batch_window_max_items=3))
+
+        async def embed(texts):
+            return [[float(len(texts))] for _ in texts]
+
+        service._embed_batch = AsyncMock(side_effect=embed)
+        await asyncio.gather(*(service.generate(f"t{i}") for i in range(7)))
+        sizes = sorted(len(c.args[0]) for c in service._embed_batch.await_args_list)
+        assert sizes == [1, 3, 3]
+
+    def test_cache_key_stable_across_runs(self):
+        """Cache keys use a fixed 128-bit BLAKE2b digest of the text."""
+        service = EmbeddingService(VectorConfig(dimension=4))
+        assert service._cache_key("hello") == (
+            "emb:text-embedding-3-small:46fb7408d4f285228f4af516ea25851b"
+        )
+
+    @pytest.mark.asyncio
+    async def test_usage_metrics_recorded_per_batch(self, make_embedding_response):
+        """Usage counters advance once per provider call, by batch size."""
+        config = VectorConfig(
+            dimension=2,
+            enabled=True,
+            embedding_model="text-embedding-3-small",
+            embedding_api_key="sk-test"
+        )
+        service = EmbeddingService(config)
+        mock_response = make_embedding_response(*([0.1, 0.2] for _ in range(4)))
+        service.client.embeddings.create = AsyncMock(return_value=mock_response)
+
+        await service.generate_batch(["a", "b", "c", "d"])
+        mock_response.data = mock_response.data[:1]
+        await service.generate("e")
+        await service.generate("e")
+
+        metrics = service.get_metrics()
+        assert metrics["requests"] == 2
+        assert metrics["texts"] == 5
+        assert metrics["remote_texts"] == 5
+        assert metrics["local_texts"] == 0
+        assert metrics["avg_batch_size"] == 2.5
+        assert metrics["cache_hits"] == 1
+
+    @pytest.mark.parametrize("enabled, api_key", [(False, None), (True, "sk-test")])
+    @pytest.mark.asyncio
+    async def test_usage_metrics_count_zero_vector_fallbacks_as_failed(self, enabled, api_key):
+        """Zero-vector fallbacks count as failed_texts, never as local_texts."""
+        config = VectorConfig(
+            dimension=2,
+            enabled=enabled,
+            embedding_api_key=api_key
+        )
+        service = EmbeddingService(config)
+        if service.client:
+            service.client.embeddings.create = AsyncMock(side_effect=Exception("API Error"))
+        with patch.object(LocalEmbeddingProvider, "encode", side_effect=RuntimeError("no model")):
+            assert await service.generate("a") == [0.0, 0.0]
+            assert await service.generate_batch(["b", "c"]) == [[0.0, 0.0], [0.0, 0.0]]
+
+        metrics = service.get_metrics()
+        assert metrics["failed_texts"] == 3
+        assert metrics["local_texts"] == 0
+        assert metrics["remote_texts"] == 0
+        assert metrics["texts"] == 3
+
+    @pytest.mark.asyncio
+    async def test_whitespace_variants_distinct_by_default(self):
+        """Without cache_normalize_whitespace, whitespace variants are separate entries."""
+        config = VectorConfig(
+            dimension=2,
+            enabled=False,
+            provider_priority="local_first"
+        )
+        service = EmbeddingService(config)
+        with patch.object(LocalEmbeddingProvider, "encode", return_value=[[1.0, 2.0]]) as enc:
+            await service.generate("hello world")
+            await service.generate("hello  world")
+            assert enc.call_count == 2
+
+    async def test_fuzzy_cache_hit_on_whitespace_change(self):
+        """With cache_normalize_whitespace, texts differing only in whitespace share one entry."""
+        config = VectorConfig(
+            dimension=2,
+            enabled=False,
+            provider_priority="local_first",
+            cache_normalize_whitespace=True
+        )
+        service = EmbeddingService(config)
+        with patch.object(LocalEmbeddingProvider, "encode", return_value=[[1.0, 2.0]]) as enc:
+            await service.generate("hello world")
+            vec = await service.generate("  hello\n\tworld ")
+            assert vec == [1.0, 2.0]
+            assert enc.call_count == 1
+            await service.generate("Hello world")
+            assert enc.call_count == 2
+
+    async def test_generate_batch_dedupes_whitespace_variants(self):
+        """One batch with two whitespace variants sends a single text when folding is on."""
+        config = VectorConfig(
+            dimension=2,
+            enabled=False,
+            provider_priority="local_first",
+            cache_normalize_whitespace=True
+        )
+        service = EmbeddingService(config)
+        with patch.object(LocalEmbeddingProvider, "encode", return_value=[[1.0, 2.0]]) as enc:
+            out = await service.generate_batch(["a b", " a  b"])
+            assert enc.call_count == 1
+            assert enc.call_args[0][0] == ["a b"]
+            assert out[0] == out[1] == [1.0, 2.0]
+            assert out[0] is not out[1]
+
+    async def test_generate_batch_keeps_whitespace_variants_by_default(self):
+        """With folding off, whitespace variants in one batch are embedded separately."""
+        config = VectorConfig(
+            dimension=2,
+            enabled=False,
+            provider_priority="local_first"
+        )
+        service = EmbeddingService(config)
+        with patch.object(
+            LocalEmbeddingProvider, "encode", return_value=[[1.0, 2.0], [3.0, 4.0]]
+        ) as enc:
+            out = await service.generate_batch(["a b", " a  b"])
+            assert enc.call_args[0][0] == ["a b", " a  b"]
+            assert out == [[1.0, 2.0], [3.0, 4.0]]
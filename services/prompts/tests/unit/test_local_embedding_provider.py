@@ -20,3 +20,22 @@ class TestLocalEmbeddingProvider:
             out = prov.encode(["a","b"], batch_size=2, max_length=16)
             assert out == [[1.0,2.0],[3.0,4.0]]
 
+
+    def test_model_reused_across_calls(self):
+        prov = LocalEmbeddingProvider()
+        calls = []
+        fake_model = type("M", (), {"encode": lambda self, s, batch_size=12, max_length=8192, **kwargs: calls.append(batch_size) or {"dense_vecs": [[1.0, 2.0, 3.0]]}})()
+        with patch("prompt_manager.services.local_embedding._load_bgem3", return_value=fake_model) as load:
+            for _ in range(3):
+                prov.encode(["a"], batch_size=64, max_length=16)
+            assert load.call_count == 1
+            assert calls == [64, 64, 64]
+
+    def test_dimension_probed_once(self):
+        prov = LocalEmbeddingProvider()
+        fake_model = type("M", (), {"encode": lambda self, s, batch_size=12, max_length=8192, **kwargs: {"dense_vecs": [[1.0, 2.0, 3.0]]}})()
+        with patch("prompt_manager.services.local_embedding._load_bgem3", return_value=fake_model):
+            with patch.object(LocalEmbeddingProvider, "encode", wraps=prov.encode) as enc:
+                assert prov.get_dimension() == 3
+                assert prov.get_dimension() == 3
+                assert enc.call_count == 1
@@ -70,6 +70,50 @@ class TestVectorIndex:
         assert "CREATE VIRTUAL TABLE IF NOT EXISTS vec_prompts" in str(args)
         assert idx.use_virtual is True
 
+    @pytest.mark.asyncio
+    async def test_create_index_probe_uses_float32_blob(self):
+        """The sqlite-vec verification probe binds a packed little-endian float32 query."""
+        idx = VectorIndex(dimension=3)
+        session = AsyncMock()
+
+        mock_bind = MagicMock()
+        mock_bind.dialect.name = "sqlite"
+        session.get_bind = MagicMock(return_value=mock_bind)
+
+        await idx.create_index(session)
+
+        probe = session.execute.call_args_list[1]
+        assert "MATCH :query" in str(probe[0][0])
+        assert probe[0][1]["query"] == struct.pack('<3f', 0.0, 0.0, 0.0)
+        assert idx.use_virtual is True
+
+    @pytest.mark.asyncio
+    async def test_create_index_dimension_mismatch_recreates_table(self):
+        """A dimension mismatch on the blob probe drops and recreates the virtual table."""
+        idx = VectorIndex(dimension=3)
+        session = AsyncMock()
+
+        mock_bind = MagicMock()
+        mock_bind.dialect.name = "sqlite"
+        session.get_bind = MagicMock(return_value=mock_bind)
+
+        session.execute.side_effect = [
+            None,  # CREATE VIRTUAL TABLE (existing table with old dimension)
+            Exception('Dimension mismatch for query vector for the "description_vector" column. '
+                      'Expected 4 dimensions but received 3.'),
+            None,  # DROP TABLE
+            None,  # CREATE VIRTUAL TABLE
+        ]
+
+        await idx.create_index(session)
+
+        calls = [str(c[0][0]) for c in session.execute.call_args_list]
+        assert len(calls) == 4
+        assert "DROP TABLE IF EXISTS vec_prompts" in calls[2]
+        assert "CREATE VIRTUAL TABLE IF NOT EXISTS vec_prompts" in calls[3]
+        assert "FLOAT[3]" in calls[3]
+        assert idx.use_virtual is True
+
     @pytest.mark.asyncio
     async def test_create_index_postgresql(self):
         """Test table creation for PostgreSQL."""
@@ -204,6 +248,7 @@ class TestVectorIndex:
         
         assert "MATCH :query" in str(args)
         assert params["k"] == 5
+        assert params["query"] == struct.pack('<2f', 1.0, 2.0)
 
     @pytest.mark.asyncio
     async def test_search_sqlite_failure(self):